@@ -14,7 +14,7 @@ migrate = Migrate()
 
 def setup_logging(app):
     """Настройка логирования"""
-    if not app.debug:
+    if not app.debug and not app.testing:
         if not os.path.exists("logs"):
             os.makedirs("logs", exist_ok=True)
 
@@ -50,11 +50,31 @@ def create_app(config_name="default"):
     # Модели для работы с миграциями
     from app import models  # noqa: F401
 
+    # Разделение данных по компаниям
+    from app import tenancy
+
+    tenancy.init_app(app)
+
+    # Журнал изменений сотрудников
+    from app.history import history_writer
+
+    history_writer.init_app(app)
+
+    # Фоновые задачи
+    from app.jobs import job_runner
+
+    job_runner.init_app(app)
+
     # blueprints
     from app.main import bp as main_bp
 
     app.register_blueprint(main_bp)
 
+    # Метрики для нагрузочного тестирования
+    from app.metrics import metrics
+
+    metrics.init_app(app)
+
     setup_logging(app)
 
     return app
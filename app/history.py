@@ -0,0 +1,384 @@
+from collections import deque
+from datetime import datetime, timedelta
+from decimal import Decimal
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+from flask import has_request_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm.attributes import NO_VALUE
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Поля, изменения которых попадают в журнал
+TRACKED_FIELDS = ("position_id", "salary", "manager_id")
+
+
+def _normalize(field: str, value):
+    """Приведение значения к типу колонки (формы присылают строки)"""
+    if value is None or value == "":
+        return None
+    if field == "salary":
+        return Decimal(str(value)).quantize(Decimal("0.01"))
+    return int(value)
+
+
+class HistoryWriter:
+    """Фоновая запись журнала изменений сотрудников пачками
+
+    Изменения собираются событиями сессии, после коммита ставятся
+    в очередь одним элементом, а отдельный поток приводит значения
+    к типам колонок, отбрасывает пустые изменения и вставляет записи
+    одним executemany. На пути запроса остаются только чтение сырых
+    значений и постановка в очередь; это время сбора измеряется на каждый
+    коммит. Полная цена журнала для коммита (active_history, конкуренция
+    потока записи за базу) сюда не входит, ее показывает
+    `python -m loadtest.history_overhead`.
+    Неудачная пачка повторяется с нарастающей паузой, при остановке
+    процесса поток дописывает текущую пачку и остаток очереди.
+    """
+
+    # Попыток записи пачки при остановке процесса и в синхронном режиме
+    FINAL_ATTEMPTS = 3
+    MAX_RETRY_DELAY = 30.0
+
+    def __init__(self):
+        self.app = None
+        # Элемент очереди - записи одного коммита
+        self._queue: "queue.Queue[list]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pid = None
+        self._overheads: "deque[float]" = deque(maxlen=10000)
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.shutdown)
+
+    def record_overhead(self, seconds: float) -> None:
+        """Учет времени сбора изменений в одном коммите
+
+        Предупреждение пишется только для коммитов внутри HTTP-запроса:
+        пачки фоновых задач не влияют на время ответа.
+        """
+        self._overheads.append(seconds)
+        limit = self.app.config["HISTORY_MAX_OVERHEAD_MS"] if self.app else None
+        if limit is not None and seconds * 1000 > limit and has_request_context():
+            logger.warning(
+                "Сбор истории изменений в коммите занял %.2f мс (лимит %.2f мс)",
+                seconds * 1000,
+                limit,
+            )
+
+    def overhead_stats(self) -> dict:
+        """Время сбора изменений по последним коммитам, мс"""
+        values = sorted(self._overheads)
+        limit = self.app.config["HISTORY_MAX_OVERHEAD_MS"] if self.app else None
+
+        def pct(p):
+            if not values:
+                return 0.0
+            return values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000
+
+        return {
+            "commits": len(values),
+            "p50_ms": pct(50),
+            "p99_ms": pct(99),
+            "max_ms": values[-1] * 1000 if values else 0.0,
+            "limit_ms": limit,
+            "over_limit": sum(1 for v in values if limit and v * 1000 > limit),
+        }
+
+    def enqueue(self, records) -> None:
+        """Передать записи на запись"""
+        if not records or self.app is None:
+            return
+        # После остановки потока записи (выход процесса) пишем сразу
+        if not self.app.config["HISTORY_ASYNC"] or self._stop.is_set():
+            self._write_with_retry(records, self.FINAL_ATTEMPTS)
+            return
+        self._queue.put(records)
+        if not self._thread_running():
+            self._ensure_thread()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться записи всего, что уже поставлено в очередь
+
+        Возвращает False, если за timeout секунд записать не удалось.
+        """
+        if self._thread_running():
+            with self._queue.all_tasks_done:
+                return self._queue.all_tasks_done.wait_for(
+                    lambda: not self._queue.unfinished_tasks, timeout
+                )
+
+        items = self._drain()
+        while items:
+            self._write_with_retry(_flatten(items), self.FINAL_ATTEMPTS)
+            for _ in items:
+                self._queue.task_done()
+            items = self._drain()
+        return True
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """Остановить поток записи, дописав текущую пачку и очередь"""
+        self._stop.set()
+        if self._thread_running():
+            self._thread.join(timeout)
+        # Поток не запускался в этом процессе или не успел: пишем сами
+        self.flush()
+
+    def _thread_running(self) -> bool:
+        return bool(
+            self._thread and self._thread.is_alive() and self._pid == os.getpid()
+        )
+
+    def _ensure_thread(self) -> None:
+        # Поток создается лениво и заново после fork воркера
+        with self._lock:
+            if self._thread_running() or self._stop.is_set():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="employee-history-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _next_batch(self, batch_size: int, interval: float):
+        """Набрать коммиты: ждать первый, затем добирать не дольше интервала"""
+        batch = []
+        size = 0
+        deadline = time.monotonic() + interval
+        while size < batch_size:
+            # Короткие ожидания, чтобы вовремя заметить остановку
+            wait = 0 if self._stop.is_set() else min(deadline - time.monotonic(), 0.1)
+            try:
+                if wait > 0:
+                    item = self._queue.get(timeout=wait)
+                else:
+                    item = self._queue.get_nowait()
+                batch.append(item)
+                size += len(item)
+            except queue.Empty:
+                if self._stop.is_set():
+                    break
+                if time.monotonic() >= deadline:
+                    if batch:
+                        break
+                    deadline = time.monotonic() + interval
+        return batch
+
+    def _run(self) -> None:
+        batch_size = self.app.config["HISTORY_BATCH_SIZE"]
+        interval = self.app.config["HISTORY_FLUSH_INTERVAL"]
+        while True:
+            batch = self._next_batch(batch_size, interval)
+            if not batch:
+                if self._stop.is_set():
+                    return
+                continue
+            self._write_with_retry(_flatten(batch))
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_with_retry(self, batch, attempts: Optional[int] = None) -> bool:
+        """Записать пачку, повторяя при ошибках
+
+        Без ограничения попыток повторяет, пока процесс не начнет
+        останавливаться. Если записать так и не удалось, записи
+        выводятся в лог целиком, чтобы их можно было восстановить.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            error = self._write(batch)
+            if error is None:
+                return True
+            limit = attempts or (self.FINAL_ATTEMPTS if self._stop.is_set() else None)
+            if limit is not None and attempt >= limit:
+                logger.error(
+                    "Не удалось записать %d записей истории сотрудников "
+                    "после %d попыток: %r",
+                    len(batch),
+                    attempt,
+                    batch,
+                )
+                return False
+            delay = min(0.5 * 2 ** (attempt - 1), self.MAX_RETRY_DELAY)
+            logger.warning(
+                "Ошибка записи истории (%s), повтор через %.1f с", error, delay
+            )
+            if limit is None:
+                self._stop.wait(delay)
+            else:
+                time.sleep(delay)
+
+    def _write(self, batch) -> Optional[Exception]:
+        from app import db
+        from app.models import EmployeeHistory
+
+        rows = _prepare(batch)
+        if not rows:
+            return None
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(EmployeeHistory.__table__.insert(), rows)
+        except Exception as e:
+            return e
+        return None
+
+
+history_writer = HistoryWriter()
+
+
+def _flatten(items):
+    return [record for records in items for record in records]
+
+
+def _raw_snapshot(state, action: str, changed_at: datetime) -> dict:
+    """Сырые значения сотрудника без приведения типов (на пути запроса)
+
+    Прежние значения берутся из committed_state: в after_flush он еще
+    содержит исходные значения измененных атрибутов.
+    """
+    values = state.dict
+    committed = state.committed_state
+    record = {
+        "employee_id": values.get("id"),
+        "tenant_id": values.get("tenant_id"),
+        "action": action,
+        "changed_at": changed_at,
+        "full_name": values.get("full_name"),
+    }
+    for field in TRACKED_FIELDS:
+        current = values.get(field)
+        old = committed.get(field, current)
+        record[field] = current
+        record[f"old_{field}"] = current if old is NO_VALUE else old
+    return record
+
+
+def _prepare(records):
+    """Приведение значений к типам колонок и отбор реальных изменений"""
+    from app.models import EmployeeHistory
+
+    rows = []
+    for record in records:
+        row = dict(record)
+        for field in TRACKED_FIELDS:
+            row[field] = _normalize(field, row[field])
+            row[f"old_{field}"] = _normalize(field, row[f"old_{field}"])
+        if row["action"] == EmployeeHistory.ACTION_UPDATE and not any(
+            row[field] != row[f"old_{field}"] for field in TRACKED_FIELDS
+        ):
+            continue
+        rows.append(row)
+    return rows
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    from app.models import Employee, EmployeeHistory
+
+    started = time.perf_counter()
+    # В after_flush new/dirty/deleted еще содержат состояние до flush
+    changes = [
+        (obj, action)
+        for objects, action in (
+            (session.new, EmployeeHistory.ACTION_CREATE),
+            (session.dirty, EmployeeHistory.ACTION_UPDATE),
+            (session.deleted, EmployeeHistory.ACTION_DELETE),
+        )
+        for obj in objects
+        if isinstance(obj, Employee)
+    ]
+    if changes:
+        pending = session.info.setdefault("employee_history", [])
+        changed_at = datetime.utcnow()
+        for obj, action in changes:
+            state = inspect(obj)
+            if action == EmployeeHistory.ACTION_UPDATE and not any(
+                field in state.committed_state for field in TRACKED_FIELDS
+            ):
+                continue
+            pending.append(_raw_snapshot(state, action, changed_at))
+
+    session.info["employee_history_seconds"] = (
+        session.info.get("employee_history_seconds", 0.0)
+        + time.perf_counter()
+        - started
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_on_commit(session):
+    records = session.info.pop("employee_history", None)
+    seconds = session.info.pop("employee_history_seconds", None)
+    if not records:
+        return
+    started = time.perf_counter()
+    history_writer.enqueue(records)
+    history_writer.record_overhead(seconds + time.perf_counter() - started)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("employee_history", None)
+    session.info.pop("employee_history_seconds", None)
+
+
+def compact_history(keep_days: int) -> int:
+    """Удалить записи старше keep_days дней
+
+    Для каждого сотрудника последняя запись до границы сохраняется
+    как базовое состояние; удаленные сотрудники вычищаются полностью.
+    Возвращает количество удаленных записей.
+    """
+    from app import db
+    from app.models import EmployeeHistory
+
+    history_writer.flush()
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+
+    ranked = (
+        db.select(
+            EmployeeHistory.id,
+            EmployeeHistory.action,
+            db.func.row_number()
+            .over(
+                partition_by=EmployeeHistory.employee_id,
+                order_by=(EmployeeHistory.changed_at.desc(), EmployeeHistory.id.desc()),
+            )
+            .label("rn"),
+        )
+        .where(EmployeeHistory.changed_at < cutoff)
+        .subquery()
+    )
+    baseline = db.select(ranked.c.id).where(
+        ranked.c.rn == 1, ranked.c.action != EmployeeHistory.ACTION_DELETE
+    )
+
+    result = db.session.execute(
+        db.delete(EmployeeHistory)
+        .where(EmployeeHistory.changed_at < cutoff)
+        .where(EmployeeHistory.id.notin_(baseline))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
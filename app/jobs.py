@@ -0,0 +1,502 @@
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+import csv
+import inspect
+import logging
+import os
+import socket
+import threading
+import time
+
+from sqlalchemy import update
+
+from app.tenancy import set_current_tenant
+
+logger = logging.getLogger(__name__)
+
+# Зарегистрированные обработчики: вид задачи -> функция
+_handlers: Dict[str, Callable] = {}
+
+
+def job(kind: str):
+    """Декоратор регистрации обработчика фоновой задачи"""
+
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+
+    return decorator
+
+
+def registered_kinds():
+    """Список видов задач, которые можно поставить в очередь"""
+    return sorted(_handlers)
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем
+
+    Обработчик может передать итог уже зафиксированной части работы,
+    он сохраняется в result отмененной задачи.
+    """
+
+    def __init__(self, result=None):
+        super().__init__()
+        self.result = result
+
+
+class JobInterrupted(Exception):
+    """Воркер останавливается, задача возвращается в очередь"""
+
+
+class JobContext:
+    """Доступ обработчика к прогрессу и флагу отмены своей задачи
+
+    Прогресс пишется отдельным коротким соединением, чтобы не
+    фиксировать незавершенную работу обработчика в его сессии.
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        export_dir: str,
+        stopping: Optional[threading.Event] = None,
+    ):
+        self.job_id = job_id
+        self.export_dir = export_dir
+        self.stopping = stopping
+
+    def progress(self, done: int, total: int) -> None:
+        """Обновить прогресс и проверить запрос отмены или остановку воркера"""
+        from app import db
+        from app.models import Job
+
+        percent = min(100, done * 100 // total) if total else 100
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(Job)
+                .where(Job.id == self.job_id)
+                .values(progress=percent, heartbeat_at=datetime.utcnow())
+            )
+            cancel = conn.execute(
+                db.select(Job.cancel_requested).where(Job.id == self.job_id)
+            ).scalar()
+        if cancel:
+            raise JobCancelled()
+        if self.stopping is not None and self.stopping.is_set():
+            raise JobInterrupted()
+
+
+def enqueue(kind: str, params: Optional[dict] = None):
+    """Поставить задачу в очередь
+
+    Параметры сверяются с сигнатурой обработчика сразу, чтобы ошибка
+    вернулась клиенту, а не проявилась позже в воркере.
+    """
+    from app import db
+    from app.models import Job
+
+    if kind not in _handlers:
+        raise ValueError(f"Неизвестный вид задачи: {kind}")
+    if params is None:
+        params = {}
+    if not isinstance(params, dict):
+        raise ValueError("Параметры задачи должны быть объектом")
+    try:
+        inspect.signature(_handlers[kind]).bind(None, **params)
+    except TypeError as e:
+        raise ValueError(f"Неверные параметры задачи {kind}: {e}")
+
+    new_job = Job(kind=kind, params=params)
+    db.session.add(new_job)
+    db.session.commit()
+    job_runner.wake()
+    return new_job
+
+
+def request_cancel(target) -> None:
+    """Отменить задачу: из очереди сразу, выполняющуюся - при следующей проверке"""
+    from app import db
+    from app.models import Job
+
+    if target.is_finished:
+        return
+    db.session.execute(
+        update(Job)
+        .where(Job.id == target.id, Job.status == Job.STATUS_QUEUED)
+        .values(status=Job.STATUS_CANCELLED, finished_at=datetime.utcnow())
+    )
+    db.session.execute(
+        update(Job).where(Job.id == target.id).values(cancel_requested=True)
+    )
+    db.session.commit()
+    db.session.refresh(target)
+
+
+def claim_next(worker: str) -> Optional[int]:
+    """Захватить самую старую задачу из очереди
+
+    Захват - условный UPDATE по статусу, поэтому несколько воркеров
+    (потоков или процессов) не возьмут одну задачу дважды.
+    """
+    from app import db
+    from app.models import Job
+
+    candidates = db.session.execute(
+        db.select(Job.id)
+        .where(Job.status == Job.STATUS_QUEUED)
+        .order_by(Job.created_at, Job.id)
+        .limit(5)
+    ).scalars().all()
+
+    for job_id in candidates:
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == Job.STATUS_QUEUED)
+            .values(
+                status=Job.STATUS_RUNNING,
+                worker=worker,
+                started_at=now,
+                heartbeat_at=now,
+            )
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+    return None
+
+
+def requeue_stale(timeout: int) -> int:
+    """Вернуть в очередь задачи, воркер которых перестал отвечать"""
+    from app import db
+    from app.models import Job
+
+    border = datetime.utcnow() - timedelta(seconds=timeout)
+    count = db.session.execute(
+        update(Job)
+        .where(Job.status == Job.STATUS_RUNNING, Job.heartbeat_at < border)
+        .values(status=Job.STATUS_QUEUED, worker=None, progress=0)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def release_running(workers) -> int:
+    """Вернуть в очередь задачи, которые выполняют указанные воркеры"""
+    from app import db
+    from app.models import Job
+
+    if not workers:
+        return 0
+    count = db.session.execute(
+        update(Job)
+        .where(Job.status == Job.STATUS_RUNNING, Job.worker.in_(workers))
+        .values(status=Job.STATUS_QUEUED, worker=None, progress=0)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def run_job(
+    job_id: int, export_dir: str, stopping: Optional[threading.Event] = None
+) -> None:
+    """Выполнить захваченную задачу и записать итог"""
+    from app import db
+    from app.models import Job
+
+    current = db.session.get(Job, job_id)
+    handler = _handlers.get(current.kind)
+    # Обработчик видит только данные компании, поставившей задачу
+    set_current_tenant(current.tenant_id)
+    status, result, error = Job.STATUS_DONE, None, None
+
+    try:
+        if handler is None:
+            raise ValueError(f"Неизвестный вид задачи: {current.kind}")
+        result = handler(JobContext(job_id, export_dir, stopping), **current.params)
+    except JobCancelled as e:
+        db.session.rollback()
+        status, result = Job.STATUS_CANCELLED, e.result
+    except JobInterrupted:
+        db.session.rollback()
+        release_running([current.worker])
+        logger.info("Задача %s возвращена в очередь при остановке воркера", job_id)
+        return
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Задача %s (%s) завершилась ошибкой", job_id, current.kind)
+        status, error = Job.STATUS_FAILED, str(e)
+
+    values = {
+        "status": status,
+        "result": result,
+        "error": error,
+        "finished_at": datetime.utcnow(),
+    }
+    if status == Job.STATUS_DONE:
+        values["progress"] = 100
+    db.session.execute(update(Job).where(Job.id == job_id).values(**values))
+    db.session.commit()
+
+
+class JobRunner:
+    """Пул потоков, выполняющих задачи из таблицы jobs
+
+    Очередью служит сама база данных, внешний брокер не нужен.
+    Запускается внутри веб-процесса (JOBS_IN_PROCESS) или отдельно
+    командой `flask run-worker`.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        # Воркер -> id выполняемой задачи
+        self._running: Dict[str, int] = {}
+        self._last_requeue = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        if app.config["JOBS_IN_PROCESS"]:
+            app.before_request(self.ensure_started)
+
+    def ensure_started(self, threads: Optional[int] = None) -> None:
+        """Запустить потоки, если они еще не работают в этом процессе"""
+        with self._lock:
+            if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            count = threads or self.app.config["JOBS_WORKERS"]
+            name = f"{socket.gethostname()}:{os.getpid()}"
+            self._threads = [
+                threading.Thread(
+                    target=self._run,
+                    args=(f"{name}:{i}",),
+                    name=f"job-worker-{i}",
+                    daemon=True,
+                )
+                for i in range(count)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def wake(self) -> None:
+        """Разбудить простаивающие потоки после постановки задачи"""
+        self._wakeup.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Остановить потоки
+
+        Выполняющиеся задачи прерываются при следующем обновлении
+        прогресса и возвращаются в очередь. Задачи потоков, не успевших
+        завершиться за timeout, тоже возвращаются в очередь.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            busy = list(self._running)
+        if busy:
+            with self.app.app_context():
+                requeued = release_running(busy)
+            if requeued:
+                logger.warning("При остановке возвращено в очередь задач: %s", requeued)
+
+    def join(self) -> None:
+        """Ждать завершения потоков (для отдельного процесса воркера)"""
+        for thread in self._threads:
+            while thread.is_alive():
+                thread.join(1.0)
+
+    def _requeue_due(self) -> bool:
+        """Пора ли искать зависшие задачи (один поток на процесс)"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_requeue < self.app.config["JOBS_REQUEUE_INTERVAL"]:
+                return False
+            self._last_requeue = now
+            return True
+
+    def _run(self, worker: str) -> None:
+        interval = self.app.config["JOBS_POLL_INTERVAL"]
+        export_dir = self.app.config["JOBS_EXPORT_DIR"]
+
+        while not self._stop.is_set():
+            job_id = None
+            try:
+                with self.app.app_context():
+                    if self._requeue_due():
+                        requeued = requeue_stale(self.app.config["JOBS_STALE_TIMEOUT"])
+                        if requeued:
+                            logger.warning("Возвращено в очередь зависших задач: %s", requeued)
+                    job_id = claim_next(worker)
+                    if job_id is not None:
+                        with self._lock:
+                            self._running[worker] = job_id
+                        try:
+                            run_job(job_id, export_dir, self._stop)
+                        finally:
+                            with self._lock:
+                                self._running.pop(worker, None)
+            except Exception:
+                logger.exception("Ошибка воркера %s", worker)
+
+            if job_id is None:
+                self._wakeup.wait(interval)
+                self._wakeup.clear()
+
+
+job_runner = JobRunner()
+
+
+# Обработчики задач
+
+
+@job("reassign_subordinates")
+def reassign_subordinates(ctx: JobContext, from_manager_id: int, to_manager_id: int):
+    """Перевод всех подчиненных одного руководителя к другому"""
+    from app import db
+    from app.models import Employee
+
+    source = db.session.get(Employee, from_manager_id)
+    target = db.session.get(Employee, to_manager_id)
+    if source is None or target is None:
+        raise ValueError("Руководитель не найден")
+
+    # Цепочка руководителей нового начальника: перевод в нее создаст цикл
+    ancestors = set()
+    current = target
+    while current is not None and current.id not in ancestors:
+        ancestors.add(current.id)
+        current = current.manager
+
+    subordinates = Employee.get_by_manager(from_manager_id)
+    moved, skipped = 0, []
+    batch_size = 100
+
+    for done, employee in enumerate(subordinates, start=1):
+        if employee.id in ancestors or not target.can_be_manager_of(employee):
+            skipped.append(employee.id)
+        else:
+            employee.manager_id = target.id
+            moved += 1
+
+        if done % batch_size == 0 or done == len(subordinates):
+            db.session.commit()
+            try:
+                ctx.progress(done, len(subordinates))
+            except JobCancelled:
+                # Закоммиченные пачки не откатываются: сообщаем, сколько переведено
+                raise JobCancelled({"moved": moved, "skipped": skipped})
+
+    return {"moved": moved, "skipped": skipped}
+
+
+@job("export_employees")
+def export_employees(ctx: JobContext):
+    """Выгрузка справочника сотрудников в CSV"""
+    from app import db
+    from app.models import Employee, Position
+
+    os.makedirs(ctx.export_dir, exist_ok=True)
+    path = os.path.join(ctx.export_dir, f"employees_{ctx.job_id}.csv")
+    total = Employee.query.count()
+    page_size = 500
+
+    # Постраничная выборка по id вместо открытого курсора: прогресс пишется
+    # отдельным соединением, и незакрытое чтение в SQLite его заблокировало бы
+    query = (
+        db.select(
+            Employee.id,
+            Employee.full_name,
+            Position.title,
+            Employee.hire_date,
+            Employee.salary,
+            Employee.manager_id,
+        )
+        .join(Position)
+        .order_by(Employee.id)
+        .limit(page_size)
+    )
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["id", "full_name", "position", "hire_date", "salary", "manager_id"]
+        )
+        done, last_id = 0, 0
+        while True:
+            chunk = db.session.execute(query.where(Employee.id > last_id)).all()
+            db.session.commit()
+            if not chunk:
+                break
+            writer.writerows(chunk)
+            done += len(chunk)
+            last_id = chunk[-1].id
+            ctx.progress(done, total)
+
+    return {"path": path, "rows": done}
+
+
+@job("refresh_org_stats")
+def refresh_org_stats(ctx: JobContext):
+    """Пересчет агрегатов по должностям и размерам подразделений"""
+    from app import db
+    from app.models import Employee, Position
+
+    by_position = [
+        {
+            "position_id": position_id,
+            "title": title,
+            "employees": count,
+            "avg_salary": float(avg) if avg is not None else None,
+        }
+        for position_id, title, count, avg in db.session.execute(
+            db.select(
+                Position.id,
+                Position.title,
+                db.func.count(Employee.id),
+                db.func.avg(Employee.salary),
+            )
+            .outerjoin(Employee)
+            .group_by(Position.id, Position.title)
+            .order_by(Position.level)
+        )
+    ]
+    ctx.progress(1, 3)
+
+    # Размер подразделения считается за один проход по парам (id, manager_id)
+    children: Dict[Optional[int], list] = {}
+    for emp_id, manager_id in db.session.execute(
+        db.select(Employee.id, Employee.manager_id)
+    ):
+        children.setdefault(manager_id, []).append(emp_id)
+    ctx.progress(2, 3)
+
+    subtree = {}
+    stack = [(emp_id, False) for emp_id in children.get(None, [])]
+    while stack:
+        emp_id, expanded = stack.pop()
+        if expanded:
+            subtree[emp_id] = sum(
+                1 + subtree.get(child, 0) for child in children.get(emp_id, [])
+            )
+        else:
+            stack.append((emp_id, True))
+            stack.extend((child, False) for child in children.get(emp_id, []))
+
+    return {
+        "computed_at": datetime.utcnow().isoformat(),
+        "by_position": by_position,
+        "subtree_sizes": {
+            str(emp_id): size for emp_id, size in subtree.items() if size
+        },
+    }
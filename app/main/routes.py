@@ -1,9 +1,24 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from datetime import datetime, time
+import os
+from flask import (
+    render_template,
+    request,
+    redirect,
+    url_for,
+    flash,
+    jsonify,
+    send_file,
+)
 from app.main import bp
-from app.models import Employee, Position
+from app.models import Employee, EmployeeHistory, Job, Position
+from app import jobs
 from app import db
+from app.search_cache import search_cache
+from app.tenancy import current_tenant_id, select_tenant
 from sqlalchemy import desc
 
+SEARCH_RESULTS_LIMIT = 10
+
 
 @bp.route("/")
 def index():
@@ -24,6 +39,18 @@ def index():
     )
 
 
+@bp.route("/switch_tenant", methods=["POST"])
+def switch_tenant():
+    """Переключение компании, с которой работает пользователь"""
+    slug = request.form.get("tenant", "")
+    if select_tenant(slug):
+        flash(f"Выбрана компания {slug}", "success")
+    else:
+        flash(f"Компания {slug} не найдена", "error")
+    # Идентификаторы на текущей странице принадлежат прежней компании
+    return redirect(url_for("main.index"))
+
+
 @bp.route("/employees")
 def employees():
     """Страница со списком всех сотрудников"""
@@ -117,10 +144,12 @@ def add_employee():
                 manager_id=request.form["manager_id"] or None,
             )
 
-            # Валидация
+            db.session.add(employee)
+
+            # Валидация: должность и руководитель только из текущей компании
+            employee.validate_references()
             employee.validate_manager_assignment()
 
-            db.session.add(employee)
             db.session.commit()
 
             flash("Сотрудник успешно добавлен!", "success")
@@ -153,7 +182,8 @@ def edit_employee(id):
             employee.hire_date = request.form["hire_date"] or None
             employee.manager_id = request.form["manager_id"] or None
 
-            # Валидация
+            # Валидация: должность и руководитель только из текущей компании
+            employee.validate_references()
             employee.validate_manager_assignment()
 
             db.session.commit()
@@ -337,9 +367,106 @@ def get_potential_managers(employee_id):
 
 @bp.route("/api/search_employees")
 def search_employees_autocomplete():
-    query = request.args.get("q", "")
+    """Автодополнение имен сотрудников с кэшированием результатов"""
+    query = request.args.get("q", "").strip()
     if len(query) < 2:
         return jsonify([])
 
-    employees = Employee.search_by_name(query)
-    return jsonify([{"id": e.id, "name": e.full_name} for e in employees[:10]])
+    cache_key = f"{current_tenant_id()}:{query}"
+    # Поколение фиксируется до запроса: сброс во время запроса отменит запись
+    generation = search_cache.generation
+    results = search_cache.get(cache_key)
+    if results is None:
+        employees = Employee.search_by_name(query, limit=SEARCH_RESULTS_LIMIT)
+        results = [{"id": e.id, "name": e.full_name} for e in employees]
+        search_cache.set(cache_key, results, generation)
+
+    response = jsonify(results)
+    response.headers["Cache-Control"] = "private, max-age=30"
+    return response
+
+
+@bp.route("/api/employee_history/<int:employee_id>")
+def employee_history(employee_id):
+    """История изменений сотрудника"""
+    records = EmployeeHistory.get_for_employee(employee_id)
+    return jsonify([record.to_dict() for record in records])
+
+
+@bp.route("/api/org_chart")
+def org_chart():
+    """Организационная структура на дату (?as_of=YYYY-MM-DD, конец дня)"""
+    as_of = request.args.get("as_of", "")
+    try:
+        moment = datetime.combine(datetime.strptime(as_of, "%Y-%m-%d"), time.max)
+    except ValueError:
+        return (
+            jsonify({"success": False, "message": "Укажите дату в формате YYYY-MM-DD"}),
+            400,
+        )
+
+    return jsonify(
+        {"success": True, "as_of": as_of, "employees": EmployeeHistory.org_chart_as_of(moment)}
+    )
+
+
+@bp.route("/api/jobs", methods=["POST"])
+def create_job():
+    """Постановка фоновой задачи в очередь"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return (
+            jsonify({"success": False, "message": "Ожидается JSON-объект"}),
+            400,
+        )
+    kind = data.get("kind")
+    if kind not in jobs.registered_kinds():
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "message": f"Неизвестный вид задачи: {kind}",
+                    "kinds": jobs.registered_kinds(),
+                }
+            ),
+            400,
+        )
+
+    try:
+        new_job = jobs.enqueue(kind, data.get("params"))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return (
+        jsonify(
+            {
+                "success": True,
+                "job": new_job.to_dict(),
+                "status_url": url_for("main.job_status", job_id=new_job.id),
+            }
+        ),
+        202,
+    )
+
+
+@bp.route("/api/jobs/<int:job_id>")
+def job_status(job_id):
+    """Состояние и прогресс фоновой задачи"""
+    job = Job.query.get_or_404(job_id)
+    return jsonify({"success": True, "job": job.to_dict()})
+
+
+@bp.route("/api/jobs/<int:job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    """Отмена фоновой задачи"""
+    job = Job.query.get_or_404(job_id)
+    jobs.request_cancel(job)
+    return jsonify({"success": True, "job": job.to_dict()})
+
+
+@bp.route("/api/jobs/<int:job_id>/download")
+def download_job_result(job_id):
+    """Скачивание файла, созданного задачей экспорта"""
+    job = Job.query.get_or_404(job_id)
+    if job.status != Job.STATUS_DONE or not (job.result or {}).get("path"):
+        return jsonify({"success": False, "message": "Файл еще не готов"}), 404
+    return send_file(os.path.abspath(job.result["path"]), as_attachment=True)
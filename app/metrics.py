@@ -0,0 +1,193 @@
+from collections import defaultdict
+import json
+import os
+import sys
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from app.history import history_writer
+
+
+class Metrics:
+    """Счетчики процесса для нагрузочного тестирования
+
+    Собирает время ответа по представлениям, время и число SQL-запросов,
+    заполненность пула соединений и ошибки блокировок. SQL-запросы
+    фоновых потоков (журнал изменений, задачи) считаются отдельно и не
+    входят в sql_count. Каждый воркер gunicorn считает свое и сохраняет
+    итог в METRICS_DIR при выходе.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.views = defaultdict(lambda: {"count": 0, "seconds": 0.0, "max": 0.0})
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.background_sql_count = 0
+        self.pool_checkouts = 0
+        self.pool_saturated_checkouts = 0
+        self.pool_max_checked_out = 0
+        self.lock_errors = 0
+
+    def init_app(self, app):
+        if not app.config["METRICS_ENABLED"]:
+            return
+        self.app = app
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+
+        from app import db
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+        event.listen(engine.pool, "checkout", self._on_checkout)
+        self._pool = engine.pool
+
+        if app.config["PROFILER_ENABLED"]:
+            profiler.start(app.config["PROFILER_INTERVAL_MS"] / 1000)
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        profiler.enter(request.endpoint or request.path)
+
+    def _finish_request(self, exc):
+        profiler.leave()
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            view = self.views[request.endpoint or request.path]
+            view["count"] += 1
+            view["seconds"] += elapsed
+            view["max"] = max(view["max"], elapsed)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        with self._lock:
+            if not has_request_context():
+                self.background_sql_count += 1
+                return
+            self.sql_count += 1
+            self.sql_seconds += elapsed
+
+    def _handle_error(self, context):
+        message = str(context.original_exception).lower()
+        if "locked" in message or "lock timeout" in message or "deadlock" in message:
+            with self._lock:
+                self.lock_errors += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        pool = self._pool
+        # У SQLite в памяти и NullPool нет ограниченной емкости
+        if hasattr(pool, "checkedout") and hasattr(pool, "_max_overflow"):
+            checked_out = pool.checkedout()
+            capacity = pool.size() + max(pool._max_overflow, 0)
+        else:
+            checked_out, capacity = 0, None
+        with self._lock:
+            self.pool_checkouts += 1
+            self.pool_max_checked_out = max(self.pool_max_checked_out, checked_out)
+            if capacity is not None and checked_out >= capacity:
+                self.pool_saturated_checkouts += 1
+
+    def snapshot(self) -> dict:
+        """Текущие значения счетчиков"""
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "views": {name: dict(view) for name, view in self.views.items()},
+                "sql_count": self.sql_count,
+                "sql_seconds": self.sql_seconds,
+                "background_sql_count": self.background_sql_count,
+                "pool_checkouts": self.pool_checkouts,
+                "pool_saturated_checkouts": self.pool_saturated_checkouts,
+                "pool_max_checked_out": self.pool_max_checked_out,
+                "lock_errors": self.lock_errors,
+                "history_overhead": history_writer.overhead_stats(),
+            }
+
+    def dump(self) -> None:
+        """Сохранить метрики и профиль процесса в METRICS_DIR"""
+        directory = self.app.config["METRICS_DIR"] if self.app else None
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        pid = os.getpid()
+        with open(os.path.join(directory, f"metrics-{pid}.json"), "w") as f:
+            json.dump(self.snapshot(), f)
+        profiler.dump(os.path.join(directory, f"profile-{pid}.folded"))
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик потоков, обрабатывающих запросы
+
+    Раз в interval секунд снимает стеки через sys._current_frames()
+    и копит их в свернутом формате (folded) с именем представления
+    в корне стека - его понимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self):
+        self._active = {}
+        self._stacks = defaultdict(int)
+        self._thread = None
+        self._interval = 0.005
+
+    def start(self, interval: float) -> None:
+        self._interval = interval
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def enter(self, view: str) -> None:
+        if self._thread:
+            self._active[threading.get_ident()] = view
+
+    def leave(self) -> None:
+        self._active.pop(threading.get_ident(), None)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self._interval)
+            frames = sys._current_frames()
+            for ident, view in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(view)
+                self._stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path: str) -> None:
+        """Записать накопленные стеки в свернутом формате"""
+        if not self._stacks:
+            return
+        with open(path, "w") as f:
+            for stack, count in list(self._stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+
+metrics = Metrics()
+profiler = SamplingProfiler()
@@ -1,25 +1,67 @@
 from datetime import datetime, date
 from app import db
 from sqlalchemy import CheckConstraint
+from sqlalchemy.orm import declared_attr
 from typing import List, Optional
 
 
-class Position(db.Model):
+class Tenant(db.Model):
+    """Компания (дочернее общество) со своим справочником сотрудников"""
+
+    __tablename__ = "tenants"
+
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(50), nullable=False, unique=True)
+    name = db.Column(db.String(200), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<Tenant {self.slug}>"
+
+    def to_dict(self) -> dict:
+        """Преобразование объекта в словарь для JSON"""
+        return {"id": self.id, "slug": self.slug, "name": self.name}
+
+
+class TenantMixin:
+    """Принадлежность записи компании
+
+    Запросы к моделям с этим миксином автоматически ограничиваются
+    текущей компанией сессии, новые записи получают ее tenant_id
+    (см. app/tenancy.py).
+    """
+
+    @declared_attr
+    def tenant_id(cls):
+        return db.Column(db.Integer, db.ForeignKey("tenants.id"), nullable=False)
+
+
+class Position(TenantMixin, db.Model):
     """Должность сотрудника"""
 
     __tablename__ = "positions"
 
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(100), nullable=False, unique=True)
+    title = db.Column(db.String(100), nullable=False)
     level = db.Column(db.Integer, nullable=False)
 
-    # Связь с сотрудниками (один ко многим)
-    employees = db.relationship("Employee", backref="position", lazy="dynamic")
+    # Связь с сотрудниками (один ко многим). Внешний ключ составной
+    # (tenant_id, position_id), но id уникален сам по себе, поэтому связь
+    # строится и заполняется только по position_id
+    employees = db.relationship(
+        "Employee",
+        backref="position",
+        lazy="dynamic",
+        primaryjoin="Position.id == Employee.position_id",
+        foreign_keys="Employee.position_id",
+    )
 
     # Ограничения
     __table_args__ = (
         CheckConstraint("level >= 1 AND level <= 5", name="valid_level"),
-        db.UniqueConstraint("title", name="unique_position_title"),
+        db.UniqueConstraint("tenant_id", "title", name="unique_position_title"),
+        # Цель составного внешнего ключа employees -> positions
+        db.UniqueConstraint("tenant_id", "id", name="unique_position_tenant_id"),
+        db.Index("ix_positions_tenant_level", "tenant_id", "level"),
     )
 
     def __repr__(self) -> str:
@@ -45,26 +87,51 @@ class Position(db.Model):
         return Position.query.filter_by(level=level).all()
 
 
-class Employee(db.Model):
+class Employee(TenantMixin, db.Model):
     """Cотрудник"""
 
     __tablename__ = "employees"
 
     id = db.Column(db.Integer, primary_key=True)
     full_name = db.Column(db.String(200), nullable=False)
-    position_id = db.Column(db.Integer, db.ForeignKey("positions.id"), nullable=False)
+    # active_history: прежние значения нужны журналу изменений (app/history.py)
+    position_id = db.column_property(
+        db.Column(db.Integer, nullable=False), active_history=True
+    )
     hire_date = db.Column(db.Date, nullable=False, default=date.today)
-    salary = db.Column(db.Numeric(10, 2), nullable=False)
-    manager_id = db.Column(db.Integer, db.ForeignKey("employees.id"), nullable=True)
+    salary = db.column_property(
+        db.Column(db.Numeric(10, 2), nullable=False), active_history=True
+    )
+    manager_id = db.column_property(
+        db.Column(db.Integer, nullable=True), active_history=True
+    )
 
-    # Связь для иерархии сотрудников
-    manager = db.relationship("Employee", remote_side=[id], backref="subordinates")
+    # Связь для иерархии сотрудников (по manager_id, как и связь с должностью)
+    manager = db.relationship(
+        "Employee",
+        remote_side=[id],
+        backref="subordinates",
+        primaryjoin="Employee.manager_id == Employee.id",
+        foreign_keys=[manager_id],
+    )
 
-    # Ограничения
+    # Ограничения: должность и руководитель - из той же компании
     __table_args__ = (
         CheckConstraint("salary > 0", name="salary_positive"),
-        db.ForeignKeyConstraint(["position_id"], ["positions.id"], name="fk_position"),
-        db.ForeignKeyConstraint(["manager_id"], ["employees.id"], name="fk_manager"),
+        db.UniqueConstraint("tenant_id", "id", name="unique_employee_tenant_id"),
+        db.ForeignKeyConstraint(
+            ["tenant_id", "position_id"],
+            ["positions.tenant_id", "positions.id"],
+            name="fk_position",
+        ),
+        db.ForeignKeyConstraint(
+            ["tenant_id", "manager_id"],
+            ["employees.tenant_id", "employees.id"],
+            name="fk_manager",
+        ),
+        db.Index("ix_employees_tenant_full_name", "tenant_id", "full_name"),
+        db.Index("ix_employees_tenant_manager", "tenant_id", "manager_id"),
+        db.Index("ix_employees_tenant_position", "tenant_id", "position_id"),
     )
 
     def __repr__(self) -> str:
@@ -106,6 +173,12 @@ class Employee(db.Model):
         """Проверка, может ли данный сотрудник быть руководителем другого сотрудника"""
         if not self.position or not employee.position:
             return False
+        if (
+            self.tenant_id is not None
+            and employee.tenant_id is not None
+            and self.tenant_id != employee.tenant_id
+        ):
+            return False
         return self.position.level < employee.position.level
 
     @staticmethod
@@ -134,9 +207,12 @@ class Employee(db.Model):
         return Employee.query.filter_by(manager_id=None).all()
 
     @staticmethod
-    def search_by_name(name: str) -> List["Employee"]:
+    def search_by_name(name: str, limit: Optional[int] = None) -> List["Employee"]:
         """Поиск сотрудников по имени"""
-        return Employee.query.filter(Employee.full_name.ilike(f"%{name}%")).all()
+        query = Employee.query.filter(Employee.full_name.ilike(f"%{name}%"))
+        if limit is not None:
+            query = query.order_by(Employee.full_name).limit(limit)
+        return query.all()
 
     @staticmethod
     def get_salary_range(
@@ -158,6 +234,33 @@ class Employee(db.Model):
             all_subordinates.extend(subordinate.get_all_subordinates())
         return all_subordinates
 
+    def validate_references(self) -> None:
+        """Проверка, что должность и руководитель существуют в компании сотрудника
+
+        Поиск идет запросами, ограниченными текущей компанией, поэтому
+        идентификатор чужой должности или сотрудника не найдется. Найденные
+        объекты назначаются связям для validate_manager_assignment.
+        """
+        # Без autoflush: непроверенные значения не должны уйти в базу раньше проверки
+        with db.session.no_autoflush:
+            position = Position.query.filter(Position.id == self.position_id).first()
+            manager = None
+            if self.manager_id is not None:
+                manager = Employee.query.filter(Employee.id == self.manager_id).first()
+
+        if position is None or (
+            self.tenant_id is not None and position.tenant_id != self.tenant_id
+        ):
+            raise ValueError("Должность не найдена")
+        if self.manager_id is not None and (
+            manager is None or manager.tenant_id != position.tenant_id
+        ):
+            raise ValueError("Руководитель не найден")
+
+        self.position, self.position_id = position, position.id
+        self.manager = manager
+        self.manager_id = manager.id if manager is not None else None
+
     def validate_manager_assignment(self) -> bool:
         """Валидация назначения руководителя"""
         if self.manager_id is None:
@@ -173,3 +276,212 @@ class Employee(db.Model):
             )
 
         return True
+
+
+class EmployeeHistory(TenantMixin, db.Model):
+    """Запись журнала изменений сотрудника (только добавление)
+
+    Хранит состояние сотрудника после изменения и прежние значения
+    отслеживаемых полей. Для удаления хранится последнее состояние.
+    """
+
+    __tablename__ = "employee_history"
+
+    ACTION_CREATE = "create"
+    ACTION_UPDATE = "update"
+    ACTION_DELETE = "delete"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Без внешнего ключа: история должна переживать удаление сотрудника
+    employee_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    full_name = db.Column(db.String(200), nullable=False)
+    position_id = db.Column(db.Integer, nullable=True)
+    salary = db.Column(db.Numeric(10, 2), nullable=True)
+    manager_id = db.Column(db.Integer, nullable=True)
+    old_position_id = db.Column(db.Integer, nullable=True)
+    old_salary = db.Column(db.Numeric(10, 2), nullable=True)
+    old_manager_id = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        CheckConstraint(
+            "action IN ('create', 'update', 'delete')", name="valid_history_action"
+        ),
+        db.Index("ix_employee_history_employee_changed", "employee_id", "changed_at"),
+        db.Index("ix_employee_history_changed_at", "changed_at"),
+        db.Index("ix_employee_history_tenant_changed", "tenant_id", "changed_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<EmployeeHistory {self.action} #{self.employee_id} at {self.changed_at}>"
+
+    def to_dict(self) -> dict:
+        """Преобразование объекта в словарь для JSON"""
+        return {
+            "id": self.id,
+            "employee_id": self.employee_id,
+            "action": self.action,
+            "changed_at": self.changed_at.isoformat() if self.changed_at else None,
+            "full_name": self.full_name,
+            "position_id": self.position_id,
+            "salary": float(self.salary) if self.salary is not None else None,
+            "manager_id": self.manager_id,
+            "old_position_id": self.old_position_id,
+            "old_salary": float(self.old_salary) if self.old_salary is not None else None,
+            "old_manager_id": self.old_manager_id,
+        }
+
+    @staticmethod
+    def get_for_employee(employee_id: int) -> List["EmployeeHistory"]:
+        """Получить историю изменений сотрудника в хронологическом порядке"""
+        return (
+            EmployeeHistory.query.filter_by(employee_id=employee_id)
+            .order_by(EmployeeHistory.changed_at, EmployeeHistory.id)
+            .all()
+        )
+
+    @staticmethod
+    def _ranked_rows(condition, descending: bool):
+        """Одна запись на сотрудника: ближайшая к дате с нужной стороны"""
+        order = (
+            (EmployeeHistory.changed_at.desc(), EmployeeHistory.id.desc())
+            if descending
+            else (EmployeeHistory.changed_at, EmployeeHistory.id)
+        )
+        ranked = (
+            db.select(
+                EmployeeHistory,
+                db.func.row_number()
+                .over(partition_by=EmployeeHistory.employee_id, order_by=order)
+                .label("rn"),
+            )
+            .where(condition)
+            .subquery()
+        )
+        row = db.aliased(EmployeeHistory, ranked)
+        return db.session.execute(db.select(row).where(ranked.c.rn == 1)).scalars()
+
+    @staticmethod
+    def org_chart_as_of(moment: datetime) -> List[dict]:
+        """Состав и подчиненность сотрудников на указанный момент
+
+        Для каждого сотрудника берется последняя запись не позже момента,
+        иначе прежние значения из первой записи после него, иначе текущее
+        состояние из таблицы сотрудников. Даты раньше границы компакции
+        журнала восстанавливаются неточно.
+        """
+        chart = {}
+        seen = set()
+
+        for rec in EmployeeHistory._ranked_rows(
+            EmployeeHistory.changed_at <= moment, descending=True
+        ):
+            seen.add(rec.employee_id)
+            if rec.action != EmployeeHistory.ACTION_DELETE:
+                chart[rec.employee_id] = (
+                    rec.full_name,
+                    rec.position_id,
+                    rec.salary,
+                    rec.manager_id,
+                )
+
+        for rec in EmployeeHistory._ranked_rows(
+            EmployeeHistory.changed_at > moment, descending=False
+        ):
+            if rec.employee_id in seen:
+                continue
+            seen.add(rec.employee_id)
+            if rec.action == EmployeeHistory.ACTION_UPDATE:
+                chart[rec.employee_id] = (
+                    rec.full_name,
+                    rec.old_position_id,
+                    rec.old_salary,
+                    rec.old_manager_id,
+                )
+            elif rec.action == EmployeeHistory.ACTION_DELETE:
+                chart[rec.employee_id] = (
+                    rec.full_name,
+                    rec.position_id,
+                    rec.salary,
+                    rec.manager_id,
+                )
+
+        untracked = Employee.query.filter(Employee.hire_date <= moment.date())
+        if seen:
+            untracked = untracked.filter(Employee.id.notin_(seen))
+        for emp in untracked:
+            chart[emp.id] = (emp.full_name, emp.position_id, emp.salary, emp.manager_id)
+
+        return [
+            {
+                "id": emp_id,
+                "full_name": full_name,
+                "position_id": position_id,
+                "salary": float(salary) if salary is not None else None,
+                "manager_id": manager_id if manager_id in chart else None,
+            }
+            for emp_id, (full_name, position_id, salary, manager_id) in sorted(
+                chart.items(), key=lambda item: item[1][0]
+            )
+        ]
+
+
+class Job(TenantMixin, db.Model):
+    """Фоновая задача (реорганизация, экспорт, пересчет статистики)"""
+
+    __tablename__ = "jobs"
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CANCELLED = "cancelled"
+    FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default=STATUS_QUEUED)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    worker = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        CheckConstraint("progress >= 0 AND progress <= 100", name="valid_progress"),
+        CheckConstraint(
+            "status IN ('queued', 'running', 'done', 'failed', 'cancelled')",
+            name="valid_job_status",
+        ),
+        db.Index("ix_jobs_status_created", "status", "created_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<Job {self.id} {self.kind} ({self.status}, {self.progress}%)>"
+
+    def to_dict(self) -> dict:
+        """Преобразование объекта в словарь для JSON"""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "params": self.params,
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    @property
+    def is_finished(self) -> bool:
+        """Задача завершена (успешно, с ошибкой или отменена)"""
+        return self.status in self.FINISHED_STATUSES
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+from typing import List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+class SearchCache:
+    """Ограниченный LRU-кэш результатов автодополнения (запрос -> топ-10)
+
+    Кэш живет в памяти процесса: каждый воркер хранит свою копию
+    и сбрасывает ее при изменении имен сотрудников в своих транзакциях.
+    Изменения из других процессов видны не позже чем через ttl секунд.
+
+    Поколение увеличивается при каждой инвалидации: результат, запрошенный
+    из базы до сброса, не попадает в кэш после него.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = Lock()
+        self._generation = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Приведение запроса к ключу кэша"""
+        return query.strip().lower()
+
+    @property
+    def generation(self) -> int:
+        """Номер поколения; запоминается до обращения к базе"""
+        return self._generation
+
+    def get(self, query: str) -> Optional[List[dict]]:
+        """Получить результат из кэша или None"""
+        key = self.normalize(query)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, results = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return results
+
+    def set(self, query: str, results: List[dict], generation: int) -> None:
+        """Сохранить результат, вытесняя самый старый при переполнении
+
+        Если с момента получения generation кэш сбрасывался, результат
+        мог устареть и не сохраняется.
+        """
+        key = self.normalize(query)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._data[key] = (time.monotonic(), results)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Полная инвалидация кэша"""
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+search_cache = SearchCache()
+
+
+def _names_changed(session: Session) -> bool:
+    """Проверка, затрагивает ли сессия имена сотрудников"""
+    from app.models import Employee
+
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Employee):
+            return True
+
+    for obj in session.dirty:
+        if isinstance(obj, Employee) and session.is_modified(obj):
+            if inspect(obj).attrs.full_name.history.has_changes():
+                return True
+
+    return False
+
+
+@event.listens_for(Session, "before_flush")
+def _mark_names_changed(session, flush_context, instances):
+    if _names_changed(session):
+        session.info["search_cache_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("search_cache_dirty", False):
+        search_cache.clear()
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_on_rollback(session):
+    session.info.pop("search_cache_dirty", None)
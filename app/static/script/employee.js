@@ -52,6 +52,110 @@ document.addEventListener('DOMContentLoaded', function () {
     });
 });
 
+
+// Автодополнение для поиска сотрудников
+initEmployeeAutocomplete();
+
+function initEmployeeAutocomplete() {
+    const searchInput = document.getElementById('search');
+    const suggestions = document.getElementById('suggestions');
+    if (!searchInput || !suggestions) {
+        return;
+    }
+
+    const MIN_QUERY_LENGTH = 2;
+    const RESULTS_LIMIT = 10;
+    const DEBOUNCE_MS = 250;
+    const CACHE_SIZE = 50;
+
+    // Локальный кэш: запрос -> список сотрудников
+    const cache = new Map();
+    let debounceTimer = null;
+    let controller = null;
+
+    function cacheGet(query) {
+        if (cache.has(query)) {
+            return cache.get(query);
+        }
+
+        // Если для более короткого префикса пришел неполный список,
+        // он уже содержит все совпадения - фильтруем его локально
+        for (let i = query.length - 1; i >= MIN_QUERY_LENGTH; i--) {
+            const cached = cache.get(query.slice(0, i));
+            if (cached && cached.length < RESULTS_LIMIT) {
+                return cached.filter(emp => emp.name.toLowerCase().includes(query));
+            }
+        }
+        return null;
+    }
+
+    function cacheSet(query, data) {
+        cache.delete(query);
+        cache.set(query, data);
+        if (cache.size > CACHE_SIZE) {
+            cache.delete(cache.keys().next().value);
+        }
+    }
+
+    function renderSuggestions(data) {
+        suggestions.innerHTML = '';
+        data.forEach(emp => {
+            const div = document.createElement('div');
+            div.className = 'list-group-item list-group-item-action';
+            div.textContent = emp.name;
+            div.style.cursor = 'pointer';
+            div.onclick = () => {
+                searchInput.value = emp.name;
+                suggestions.innerHTML = '';
+            };
+            suggestions.appendChild(div);
+        });
+    }
+
+    function fetchSuggestions(query) {
+        // Отменяем устаревший запрос
+        if (controller) {
+            controller.abort();
+        }
+        controller = new AbortController();
+
+        fetch(`/api/search_employees?q=${encodeURIComponent(query)}`, { signal: controller.signal })
+            .then(response => response.json())
+            .then(data => {
+                cacheSet(query, data);
+                if (searchInput.value.trim().toLowerCase() === query) {
+                    renderSuggestions(data);
+                }
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') {
+                    console.error('Error loading suggestions:', error);
+                }
+            });
+    }
+
+    searchInput.addEventListener('input', function () {
+        const query = this.value.trim().toLowerCase();
+        clearTimeout(debounceTimer);
+
+        if (query.length < MIN_QUERY_LENGTH) {
+            if (controller) {
+                controller.abort();
+            }
+            suggestions.innerHTML = '';
+            return;
+        }
+
+        const cached = cacheGet(query);
+        if (cached) {
+            renderSuggestions(cached);
+            return;
+        }
+
+        debounceTimer = setTimeout(() => fetchSuggestions(query), DEBOUNCE_MS);
+    });
+}
+
 // Функционал изменения начальника
 initManagerChangeFeature();
 
@@ -229,4 +333,4 @@ function showNotification(message, type) {
             notification.remove();
         }
     }, 5000);
-}
\ No newline at end of file
+}
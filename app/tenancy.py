@@ -0,0 +1,233 @@
+from typing import Dict, Optional
+
+from flask import abort, current_app, g, request, session
+from sqlalchemy import UniqueConstraint, event, inspect, text
+from sqlalchemy.orm import Session, with_loader_criteria
+from sqlalchemy.schema import AddConstraint
+
+# Ключ в session.info с идентификатором текущей компании
+TENANT_KEY = "tenant_id"
+
+# Ключ в cookie-сессии Flask со slug компании, выбранной пользователем
+SESSION_TENANT_KEY = "tenant"
+
+
+def current_tenant_id() -> Optional[int]:
+    """Компания текущей сессии (None - без ограничения, для CLI и обслуживания)"""
+    from app import db
+
+    return db.session.info.get(TENANT_KEY)
+
+
+def set_current_tenant(tenant_id: Optional[int]) -> None:
+    """Ограничить запросы текущей сессии одной компанией"""
+    from app import db
+
+    db.session.info[TENANT_KEY] = tenant_id
+
+
+def resolve_tenant(slug: str) -> Optional[int]:
+    """Идентификатор компании по slug
+
+    Без кэша в процессе: компанию могут удалить или пересоздать, а поиск
+    по уникальному slug - один запрос по индексу.
+    """
+    from app import db
+    from app.models import Tenant
+
+    return db.session.execute(
+        db.select(Tenant.id).where(Tenant.slug == slug)
+    ).scalar()
+
+
+def get_or_create_tenant(slug: str, name: Optional[str] = None):
+    """Получить компанию, создав ее при отсутствии"""
+    from app import db
+    from app.models import Tenant
+
+    tenant = Tenant.query.filter_by(slug=slug).first()
+    if tenant is None:
+        tenant = Tenant(slug=slug, name=name or slug)
+        db.session.add(tenant)
+        db.session.commit()
+    return tenant
+
+
+def select_tenant(slug: str) -> bool:
+    """Запомнить компанию в сессии пользователя (False - компании нет)
+
+    Сессия Flask подписана SECRET_KEY, поэтому клиент не может подменить
+    значение сам: компания меняется только здесь, и проверка прав
+    пользователя на компанию, когда появится, должна быть в этой функции.
+    """
+    if resolve_tenant(slug) is None:
+        return False
+    session[SESSION_TENANT_KEY] = slug
+    return True
+
+
+def _select_tenant_for_request():
+    """Выбор компании: выбранная в сессии, иначе настройка по умолчанию
+
+    Заголовок TENANT_HEADER учитывается, только если TENANT_HEADER_TRUSTED
+    включен (его выставляет доверенный прокси или служебный клиент).
+    """
+    slug = tenant_id = None
+    if current_app.config["TENANT_HEADER_TRUSTED"]:
+        slug = request.headers.get(current_app.config["TENANT_HEADER"])
+    if not slug:
+        slug = session.get(SESSION_TENANT_KEY)
+        tenant_id = resolve_tenant(slug) if slug else None
+        if slug and tenant_id is None:
+            # Компания удалена после выбора
+            session.pop(SESSION_TENANT_KEY)
+            slug = None
+    if not slug:
+        slug = current_app.config["DEFAULT_TENANT"]
+    if tenant_id is None:
+        tenant_id = resolve_tenant(slug)
+    if tenant_id is None:
+        abort(404, description=f"Неизвестная компания: {slug}")
+    g.tenant_slug = slug
+    set_current_tenant(tenant_id)
+
+
+def _tenant_context():
+    """Список компаний и текущая компания для переключателя в шаблонах"""
+    from app.models import Tenant
+
+    return {
+        "tenants": Tenant.query.order_by(Tenant.name).all(),
+        "current_tenant": g.get("tenant_slug"),
+    }
+
+
+def init_app(app):
+    # Должно выполняться раньше остальных обработчиков before_request
+    app.before_request_funcs.setdefault(None, []).insert(0, _select_tenant_for_request)
+    app.context_processor(_tenant_context)
+
+
+def backfill_tenant(slug: str) -> Dict[str, int]:
+    """Перевод базы, созданной до разделения по компаниям
+
+    Добавляет tenant_id в существующие таблицы и заполняет его компанией
+    slug, затем (кроме SQLite) делает столбец NOT NULL и заменяет
+    глобальные ограничения на ограничения в пределах компании.
+    Повторный запуск ничего не меняет. Возвращает число заполненных строк
+    по таблицам.
+    """
+    from app import db
+    from app.models import Employee, EmployeeHistory, Job, Position
+
+    models = (Position, Employee, EmployeeHistory, Job)
+    # Новые таблицы (tenants, журнал, задачи) создаются сразу с tenant_id
+    db.create_all()
+    tenant_id = get_or_create_tenant(slug).id
+    sqlite = db.engine.dialect.name == "sqlite"
+    filled = {}
+
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        for model in models:
+            table = model.__tablename__
+            columns = {column["name"] for column in inspector.get_columns(table)}
+            if "tenant_id" not in columns:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table} ADD COLUMN tenant_id INTEGER "
+                        "REFERENCES tenants (id)"
+                    )
+                )
+            filled[table] = conn.execute(
+                text(f"UPDATE {table} SET tenant_id = :id WHERE tenant_id IS NULL"),
+                {"id": tenant_id},
+            ).rowcount
+            if not sqlite:
+                conn.execute(
+                    text(f"ALTER TABLE {table} ALTER COLUMN tenant_id SET NOT NULL")
+                )
+
+        # SQLite не меняет ограничения существующих таблиц: там остаются
+        # прежние, а ссылки внутри компании проверяет Employee.validate_references
+        if not sqlite:
+            _replace_global_constraints(conn)
+
+        for model in models:
+            for index in model.__table__.indexes:
+                index.create(conn, checkfirst=True)
+
+    return filled
+
+
+def _replace_global_constraints(conn) -> None:
+    """Уникальность и внешние ключи в пределах компании (кроме SQLite)"""
+    from app.models import Employee, Position
+
+    tables = (Position.__table__, Employee.__table__)
+    inspector = inspect(conn)
+
+    # Прежние ограничения без tenant_id, включая безымянные из unique=True
+    for table in tables:
+        stale = [
+            item["name"]
+            for item in inspector.get_foreign_keys(table.name)
+            if "tenant_id" not in item["constrained_columns"]
+        ] + [
+            item["name"]
+            for item in inspector.get_unique_constraints(table.name)
+            if "tenant_id" not in item["column_names"]
+        ]
+        for name in stale:
+            conn.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT "{name}"'))
+
+    # Сначала уникальные (tenant_id, id) - на них ссылаются составные ключи
+    inspector = inspect(conn)
+    existing = {
+        table.name: {
+            item["name"]
+            for item in inspector.get_unique_constraints(table.name)
+            + inspector.get_foreign_keys(table.name)
+        }
+        for table in tables
+    }
+    constraints = [
+        constraint
+        for table in tables
+        for constraint in table.constraints
+        if isinstance(constraint, UniqueConstraint)
+    ] + list(Employee.__table__.foreign_key_constraints)
+    for constraint in constraints:
+        if constraint.name and constraint.name not in existing[constraint.table.name]:
+            conn.execute(AddConstraint(constraint))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _scope_to_tenant(state):
+    from app.models import TenantMixin
+
+    tenant_id = state.session.info.get(TENANT_KEY)
+    if tenant_id is None or state.execution_options.get("all_tenants", False):
+        return
+    if (state.is_select or state.is_update or state.is_delete) and not (
+        state.is_column_load or state.is_relationship_load
+    ):
+        state.statement = state.statement.options(
+            with_loader_criteria(
+                TenantMixin,
+                lambda cls: cls.tenant_id == tenant_id,
+                include_aliases=True,
+            )
+        )
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_tenant(session, flush_context, instances):
+    from app.models import TenantMixin
+
+    tenant_id = session.info.get(TENANT_KEY)
+    if tenant_id is None:
+        return
+    for obj in session.new:
+        if isinstance(obj, TenantMixin) and obj.tenant_id is None:
+            obj.tenant_id = tenant_id
@@ -16,13 +16,42 @@ class Config:
     DB_HOST = os.environ.get("DB_HOST")
     DB_PORT = os.environ.get("DB_PORT")
 
-    # SQLAlchemy настройки для PostgreSQL
+    # SQLAlchemy настройки для PostgreSQL (DATABASE_URL задает адрес целиком)
     SQLALCHEMY_DATABASE_URI = (
-        f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+        os.environ.get("DATABASE_URL")
+        or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False  # Установить True для отладки SQL запросов
 
+    # Компании: выбор пользователя в сессии, иначе компания по умолчанию.
+    # Заголовок учитывается только за доверенным прокси
+    TENANT_HEADER = "X-Tenant"
+    TENANT_HEADER_TRUSTED = os.environ.get("TENANT_HEADER_TRUSTED") == "1"
+    DEFAULT_TENANT = os.environ.get("DEFAULT_TENANT") or "default"
+
+    # Журнал изменений сотрудников
+    HISTORY_ASYNC = True  # Запись фоновым потоком вне пути запроса
+    HISTORY_BATCH_SIZE = 100
+    HISTORY_FLUSH_INTERVAL = 1.0  # Секунды ожидания пачки
+    HISTORY_MAX_OVERHEAD_MS = 2.0  # Порог времени сбора изменений в коммите запроса, мс
+    HISTORY_RETENTION_DAYS = 365
+
+    # Фоновые задачи (очередь в таблице jobs)
+    # Запускать воркеры внутри веб-процесса; 0 - только `flask run-worker`
+    JOBS_IN_PROCESS = os.environ.get("JOBS_IN_PROCESS", "1") == "1"
+    JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", 2))
+    JOBS_POLL_INTERVAL = 1.0  # Секунды между опросами очереди
+    JOBS_STALE_TIMEOUT = 300  # Через сколько секунд без прогресса задача возвращается в очередь
+    JOBS_REQUEUE_INTERVAL = 60  # Как часто воркеры ищут зависшие задачи, секунды
+    JOBS_EXPORT_DIR = "exports"
+
+    # Метрики и профилировщик (см. app/metrics.py и loadtest/)
+    METRICS_ENABLED = False
+    METRICS_DIR = os.environ.get("METRICS_DIR")  # Куда воркеры сохраняют метрики
+    PROFILER_ENABLED = False
+    PROFILER_INTERVAL_MS = 5
+
 
 class DevelopmentConfig(Config):
     """Конфигурация для разработки"""
@@ -37,9 +66,36 @@ class ProductionConfig(Config):
     DEBUG = False
 
 
+class TestingConfig(Config):
+    """Конфигурация для тестов (tests/)"""
+
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URL") or "sqlite://"
+    JOBS_IN_PROCESS = False
+    JOBS_POLL_INTERVAL = 0.05
+    HISTORY_FLUSH_INTERVAL = 0.05
+
+
+class LoadTestConfig(ProductionConfig):
+    """Конфигурация для нагрузочного тестирования под gunicorn"""
+
+    WTF_CSRF_ENABLED = False  # Скрипт нагрузки отправляет POST без токена
+    JOBS_IN_PROCESS = False  # Опрос очереди задач не должен попадать в замеры
+    METRICS_ENABLED = True
+    PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED") == "1"
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": 30,
+    }
+
+
 # Словарь конфигураций
 config = {
     "development": DevelopmentConfig,
     "production": ProductionConfig,
+    "testing": TestingConfig,
+    "loadtest": LoadTestConfig,
     "default": DevelopmentConfig,
 }
@@ -1,6 +1,9 @@
 import os
+import signal
+import click
 from app import create_app, db
-from app.models import Employee, Position
+from app.models import Employee, EmployeeHistory, Position, Tenant
+from app.tenancy import backfill_tenant, get_or_create_tenant, set_current_tenant
 from flask_migrate import upgrade
 
 
@@ -21,23 +24,63 @@ app = create_app(os.getenv("FLASK_CONFIG") or "default")
 @app.shell_context_processor
 def make_shell_context():
     """Контекст для Flask shell"""
-    return {"db": db, "Employee": Employee, "Position": Position}
+    return {
+        "db": db,
+        "Employee": Employee,
+        "Position": Position,
+        "EmployeeHistory": EmployeeHistory,
+        "Tenant": Tenant,
+        "set_current_tenant": set_current_tenant,
+    }
 
 
 @app.cli.command()
 def init_db():
     """Инициализация базы данных"""
     db.create_all()
+    get_or_create_tenant(app.config["DEFAULT_TENANT"])
     app.logger.info("База данных инициализирована!")
 
 
 @app.cli.command()
-def seed_db():
+@click.argument("slug")
+@click.argument("name", required=False)
+def create_tenant(slug, name):
+    """Создание компании со своим справочником сотрудников"""
+    tenant = get_or_create_tenant(slug, name)
+    app.logger.info(f"Компания {tenant.slug} (id={tenant.id}) готова")
+
+
+@app.cli.command()
+@click.option(
+    "--tenant",
+    "tenant_slug",
+    default=None,
+    help="Компания для существующих записей (по умолчанию DEFAULT_TENANT)",
+)
+def backfill_tenants(tenant_slug):
+    """Перевод базы, созданной до разделения по компаниям"""
+    filled = backfill_tenant(tenant_slug or app.config["DEFAULT_TENANT"])
+    for table, count in filled.items():
+        app.logger.info(f"{table}: tenant_id заполнен в {count} строках")
+
+
+@app.cli.command()
+@click.option(
+    "--tenant",
+    "tenant_slug",
+    default=None,
+    help="Компания для тестовых данных (по умолчанию DEFAULT_TENANT)",
+)
+def seed_db(tenant_slug):
     """Заполнение базы данных тестовыми данными"""
     from datetime import date, timedelta
     import random
 
-    app.logger.info("Начинаем создание тестовых данных...")
+    tenant = get_or_create_tenant(tenant_slug or app.config["DEFAULT_TENANT"])
+    set_current_tenant(tenant.id)
+
+    app.logger.info(f"Начинаем создание тестовых данных для компании {tenant.slug}...")
 
     # Создаем должности, если их нет
     positions_count = Position.query.count()
@@ -121,5 +164,41 @@ def seed_db():
     app.logger.info("Создание тестовых данных завершено!")
 
 
+@app.cli.command()
+@click.option(
+    "--days",
+    type=int,
+    default=None,
+    help="Сколько дней истории хранить (по умолчанию HISTORY_RETENTION_DAYS)",
+)
+def compact_history(days):
+    """Удаление устаревших записей журнала изменений сотрудников"""
+    from app.history import compact_history as compact
+
+    days = days if days is not None else app.config["HISTORY_RETENTION_DAYS"]
+    removed = compact(days)
+    app.logger.info(f"Журнал изменений сжат: удалено записей {removed}")
+
+
+@app.cli.command()
+@click.option("--threads", type=int, default=None, help="Количество потоков-воркеров")
+def run_worker(threads):
+    """Запуск воркеров фоновых задач отдельно от веб-процесса"""
+    from app.jobs import job_runner
+
+    def handle_sigterm(signum, frame):
+        raise SystemExit(0)
+
+    # Зависшие задачи воркеры возвращают в очередь сами (JOBS_REQUEUE_INTERVAL)
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    job_runner.ensure_started(threads)
+    app.logger.info("Воркеры фоновых задач запущены")
+    try:
+        job_runner.join()
+    except (KeyboardInterrupt, SystemExit):
+        app.logger.info("Остановка воркеров...")
+        job_runner.stop(timeout=30)
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,31 @@
+"""Настройки gunicorn: gunicorn -c gunicorn.conf.py flask_app:app
+
+Количество воркеров и потоков задается переменными окружения, чтобы
+нагрузочные сценарии (loadtest/) могли перебирать конфигурации.
+Конфигурация приложения по умолчанию - production (FLASK_CONFIG).
+"""
+
+import os
+
+# flask_app.py без FLASK_CONFIG берет конфигурацию разработки (DEBUG, эхо SQL)
+os.environ.setdefault("FLASK_CONFIG", "production")
+
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 10
+# Без preload: фоновые потоки (журнал, задачи, профилировщик) создаются в каждом воркере
+preload_app = False
+accesslog = os.environ.get("GUNICORN_ACCESSLOG")
+
+
+def worker_exit(server, worker):
+    """Возврат незавершенных задач в очередь и сохранение метрик воркера"""
+    from app.jobs import job_runner
+    from app.metrics import metrics
+
+    if job_runner.app is not None:
+        job_runner.stop(timeout=graceful_timeout / 2)
+    metrics.dump()
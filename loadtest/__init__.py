@@ -0,0 +1,4 @@
+"""Нагрузочные сценарии для WSGI-развертывания под gunicorn
+
+Запуск: python -m loadtest --help
+"""
@@ -0,0 +1,139 @@
+from datetime import date, timedelta
+from urllib.parse import quote
+import random
+
+SURNAMES = [
+    "Иванов", "Петров", "Сидоров", "Козлов", "Смирнов", "Кузнецов", "Попов",
+    "Соколов", "Лебедев", "Новиков", "Морозов", "Волков", "Соловьев", "Зайцев",
+]
+FIRST_NAMES = [
+    "Иван", "Петр", "Сергей", "Алексей", "Дмитрий", "Андрей", "Михаил",
+    "Николай", "Павел", "Олег", "Юрий", "Егор",
+]
+POSITIONS = [
+    ("CEO", 1),
+    ("Manager", 2),
+    ("Team Lead", 3),
+    ("Senior Developer", 4),
+    ("Developer", 5),
+]
+# Доля сотрудников на каждом уровне, начиная со второго
+LEVEL_SHARES = {2: 0.02, 3: 0.08, 4: 0.3, 5: 0.6}
+
+
+def seed(app, size: int, rng: random.Random, reset: bool = False) -> dict:
+    """Создать схему и заполнить ее деревом из size сотрудников
+
+    База должна быть пустой; с reset=True существующие таблицы удаляются.
+    Возвращает идентификаторы сотрудников по уровням для сценариев.
+    """
+    from sqlalchemy import inspect
+
+    from app import db
+    from app.history import history_writer
+    from app.models import Employee, Position
+    from app.tenancy import get_or_create_tenant, set_current_tenant
+
+    with app.app_context():
+        if inspect(db.engine).get_table_names():
+            if not reset:
+                raise RuntimeError(
+                    f"в базе {db.engine.url!r} уже есть таблицы; "
+                    "укажите пустую базу или --reset, чтобы удалить их"
+                )
+            db.drop_all()
+        db.create_all()
+        tenant = get_or_create_tenant(app.config["DEFAULT_TENANT"])
+        set_current_tenant(tenant.id)
+
+        positions = {}
+        for title, level in POSITIONS:
+            positions[level] = Position(title=title, level=level)
+            db.session.add(positions[level])
+        db.session.commit()
+
+        def new_employee(level, manager_id):
+            return Employee(
+                full_name=f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)}",
+                position_id=positions[level].id,
+                hire_date=date.today() - timedelta(days=rng.randint(1, 3000)),
+                salary=rng.randint(50, 300) * 1000,
+                manager_id=manager_id,
+            )
+
+        ceo = new_employee(1, None)
+        db.session.add(ceo)
+        db.session.commit()
+
+        ids = {1: [ceo.id]}
+        for level, share in LEVEL_SHARES.items():
+            batch = [
+                new_employee(level, rng.choice(ids[level - 1]))
+                for _ in range(max(1, int(size * share)))
+            ]
+            db.session.add_all(batch)
+            db.session.commit()
+            ids[level] = [employee.id for employee in batch]
+
+        history_writer.flush()
+        return ids
+
+
+class Scenarios:
+    """Смешанная нагрузка: чтение списков, карточек, иерархии и смена начальника"""
+
+    # Веса сценариев чтения
+    READS = {
+        "employees_list": 30,
+        "employee_detail": 25,
+        "autocomplete": 20,
+        "employees_search": 10,
+        "hierarchy": 5,
+    }
+
+    def __init__(self, ids: dict, write_ratio: float, rng: random.Random):
+        self.ids = ids
+        self.write_ratio = write_ratio
+        self.rng = rng
+        self.all_ids = [emp_id for level_ids in ids.values() for emp_id in level_ids]
+        self.pages = max(1, len(self.all_ids) // 10)
+
+    def pick(self):
+        """Случайный запрос: (имя сценария, метод, путь, JSON-тело)"""
+        if self.rng.random() < self.write_ratio:
+            return self.change_manager()
+        names = list(self.READS)
+        name = self.rng.choices(names, weights=[self.READS[n] for n in names])[0]
+        return getattr(self, name)()
+
+    def employees_list(self):
+        sort_by = self.rng.choice(["", "full_name", "salary", "hire_date"])
+        page = self.rng.randint(1, self.pages)
+        path = f"/employees?page={page}&sort_by={sort_by}"
+        return "employees_list", "GET", path, None
+
+    def employee_detail(self):
+        employee_id = self.rng.choice(self.all_ids)
+        return "employee_detail", "GET", f"/employee/{employee_id}", None
+
+    def autocomplete(self):
+        query = self.rng.choice(SURNAMES)[: self.rng.randint(2, 5)]
+        return "autocomplete", "GET", f"/api/search_employees?q={quote(query)}", None
+
+    def employees_search(self):
+        search = quote(self.rng.choice(SURNAMES))
+        return "employees_search", "GET", f"/employees?search={search}", None
+
+    def hierarchy(self):
+        return "hierarchy", "GET", "/hierarchy", None
+
+    def change_manager(self):
+        # Разработчик переходит к другому старшему разработчику: всегда допустимо
+        employee_id = self.rng.choice(self.ids[5])
+        manager_id = self.rng.choice(self.ids[4])
+        return (
+            "change_manager",
+            "POST",
+            f"/change_manager/{employee_id}",
+            {"manager_id": manager_id},
+        )
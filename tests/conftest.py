@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Файловая SQLite: фоновые потоки (журнал, задачи) ходят в базу своими соединениями.
+# Адрес читается конфигурацией при импорте
+os.environ.setdefault(
+    "TEST_DATABASE_URL",
+    "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="catalog-tests-"), "test.db"),
+)
+
+from app import create_app, db  # noqa: E402
+from app import history  # noqa: E402
+from app.history import HistoryWriter  # noqa: E402
+from app.models import Employee, Position  # noqa: E402
+from app.tenancy import get_or_create_tenant, set_current_tenant  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    return create_app("testing")
+
+
+@pytest.fixture
+def tenant(app):
+    """Чистая схема и контекст приложения с выбранной компанией"""
+    with app.app_context():
+        db.create_all()
+        tenant = get_or_create_tenant(app.config["DEFAULT_TENANT"])
+        set_current_tenant(tenant.id)
+        yield tenant
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def writer(app, tenant, monkeypatch):
+    """Отдельный поток записи журнала на каждый тест"""
+    instance = HistoryWriter()
+    instance.init_app(app)
+    monkeypatch.setattr(history, "history_writer", instance)
+    yield instance
+    instance.shutdown(timeout=5)
+
+
+@pytest.fixture
+def staff(tenant):
+    """Руководитель и трое подчиненных"""
+    lead = Position(title="Lead", level=2)
+    dev = Position(title="Developer", level=5)
+    db.session.add_all([lead, dev])
+    db.session.commit()
+
+    manager = Employee(full_name="Manager", position_id=lead.id, salary=1000)
+    db.session.add(manager)
+    db.session.commit()
+    employees = [
+        Employee(
+            full_name=f"Developer {i}",
+            position_id=dev.id,
+            salary=500,
+            manager_id=manager.id,
+        )
+        for i in range(3)
+    ]
+    db.session.add_all(employees)
+    db.session.commit()
+    return {"lead": lead, "dev": dev, "manager": manager, "employees": employees}
@@ -0,0 +1,120 @@
+import logging
+import time
+from decimal import Decimal
+
+from app import db
+from app.models import Employee, EmployeeHistory
+
+
+def history_for(employee_id):
+    return EmployeeHistory.get_for_employee(employee_id)
+
+
+def test_create_update_delete_are_recorded(writer, staff):
+    employee = Employee(
+        full_name="New",
+        position_id=staff["dev"].id,
+        salary=400,
+        manager_id=staff["manager"].id,
+    )
+    db.session.add(employee)
+    db.session.commit()
+    employee_id = employee.id
+
+    employee.salary = 450
+    db.session.commit()
+    db.session.delete(employee)
+    db.session.commit()
+    assert writer.flush(timeout=5)
+
+    records = history_for(employee_id)
+    assert [r.action for r in records] == ["create", "update", "delete"]
+    assert records[1].old_salary == Decimal("400.00")
+    assert records[1].salary == Decimal("450.00")
+    assert all(r.tenant_id == staff["manager"].tenant_id for r in records)
+
+
+def test_update_without_real_change_is_skipped(writer, staff):
+    employee = staff["employees"][0]
+    writer.flush(timeout=5)
+    before = len(history_for(employee.id))
+
+    # Форма присылает строку с тем же значением
+    employee.salary = "500.00"
+    db.session.commit()
+    writer.flush(timeout=5)
+
+    assert len(history_for(employee.id)) == before
+
+
+def test_rollback_discards_collected_changes(writer, staff):
+    employee = staff["employees"][0]
+    writer.flush(timeout=5)
+    before = len(history_for(employee.id))
+
+    employee.salary = 999
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    writer.flush(timeout=5)
+
+    assert len(history_for(employee.id)) == before
+
+
+def test_shutdown_writes_queued_records(app, writer, staff, monkeypatch):
+    writer.flush(timeout=5)
+    # Поток ждал бы пачку 10 секунд: остановка должна дописать ее сразу
+    monkeypatch.setitem(app.config, "HISTORY_FLUSH_INTERVAL", 10.0)
+    monkeypatch.setitem(app.config, "HISTORY_BATCH_SIZE", 1000)
+    writer.shutdown(timeout=5)
+    writer._stop.clear()
+
+    for i, employee in enumerate(staff["employees"]):
+        employee.salary = 600 + i
+        db.session.commit()
+    assert writer._thread_running()
+
+    started = time.monotonic()
+    writer.shutdown(timeout=5)
+    assert time.monotonic() - started < 5
+    assert not writer._thread_running()
+    updates = EmployeeHistory.query.filter_by(action="update").count()
+    assert updates == len(staff["employees"])
+
+
+def test_failed_batch_is_retried(writer, staff, monkeypatch):
+    writer.flush(timeout=5)
+    original = writer._write
+    failures = []
+
+    def flaky(batch):
+        if not failures:
+            failures.append(batch)
+            return RuntimeError("database is locked")
+        return original(batch)
+
+    monkeypatch.setattr(writer, "_write", flaky)
+    employee = staff["employees"][0]
+    employee.salary = 700
+    db.session.commit()
+
+    assert writer.flush(timeout=5)
+    assert failures
+    assert history_for(employee.id)[-1].salary == Decimal("700.00")
+
+
+def test_overhead_warning_only_inside_request(app, writer, staff, monkeypatch, caplog):
+    monkeypatch.setitem(app.config, "HISTORY_MAX_OVERHEAD_MS", 0.0)
+    employee = staff["employees"][0]
+
+    with caplog.at_level(logging.WARNING, logger="app.history"):
+        employee.salary = 710
+        db.session.commit()
+        assert not caplog.records
+
+        with app.test_request_context("/"):
+            employee.salary = 720
+            db.session.commit()
+        assert any("лимит" in r.getMessage() for r in caplog.records)
+
+    assert writer.overhead_stats()["commits"] >= 2
@@ -0,0 +1,202 @@
+from datetime import datetime, timedelta
+import threading
+import time
+
+import pytest
+
+from app import db, jobs
+from app.jobs import JobContext, JobRunner
+from app.models import Employee, Job
+
+
+def job_state(job_id):
+    db.session.expire_all()
+    return db.session.get(Job, job_id)
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Регистрация обработчиков только на время теста"""
+
+    def register(kind, func):
+        monkeypatch.setitem(jobs._handlers, kind, func)
+
+    return register
+
+
+def test_enqueue_checks_params_against_handler(tenant):
+    with pytest.raises(ValueError):
+        jobs.enqueue("export_employees", [1])
+    with pytest.raises(ValueError):
+        jobs.enqueue("refresh_org_stats", {"x": 1})
+    with pytest.raises(ValueError):
+        jobs.enqueue("reassign_subordinates", {"from_manager_id": 1})
+    assert Job.query.count() == 0
+
+    new_job = jobs.enqueue("refresh_org_stats")
+    assert new_job.status == Job.STATUS_QUEUED
+
+
+def test_api_rejects_malformed_job(app, tenant):
+    client = app.test_client()
+    assert client.post("/api/jobs", json=[1]).status_code == 400
+    response = client.post(
+        "/api/jobs", json={"kind": "export_employees", "params": [1]}
+    )
+    assert response.status_code == 400
+    response = client.post(
+        "/api/jobs", json={"kind": "refresh_org_stats", "params": {"x": 1}}
+    )
+    assert response.status_code == 400
+
+
+def test_each_job_is_claimed_once(app, tenant):
+    ids = {jobs.enqueue("refresh_org_stats").id for _ in range(20)}
+    claimed = []
+    lock = threading.Lock()
+
+    def worker(name):
+        with app.app_context():
+            while True:
+                job_id = jobs.claim_next(name)
+                if job_id is None:
+                    return
+                with lock:
+                    claimed.append(job_id)
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(ids)
+    assert Job.query.filter_by(status=Job.STATUS_RUNNING).count() == len(ids)
+
+
+def test_claim_skips_job_taken_by_another_worker(tenant):
+    job_id = jobs.enqueue("refresh_org_stats").id
+    assert jobs.claim_next("first") == job_id
+    assert jobs.claim_next("second") is None
+    assert job_state(job_id).worker == "first"
+
+
+def test_cancel_queued_job_finishes_it(tenant):
+    queued = jobs.enqueue("refresh_org_stats")
+    jobs.request_cancel(queued)
+
+    assert queued.status == Job.STATUS_CANCELLED
+    assert jobs.claim_next("w") is None
+
+
+def test_cancel_running_job_stops_at_progress(tenant, handlers):
+    def steps(ctx: JobContext):
+        for done in range(1, 4):
+            if done == 2:
+                jobs.request_cancel(db.session.get(Job, ctx.job_id))
+            ctx.progress(done, 3)
+        return {"steps": 3}
+
+    handlers("steps", steps)
+    running = jobs.enqueue("steps")
+    jobs.claim_next("w")
+    jobs.run_job(running.id, "exports")
+
+    state = job_state(running.id)
+    assert state.status == Job.STATUS_CANCELLED
+    assert state.result is None
+
+
+def test_cancelled_reassign_reports_moved_rows(tenant, staff, monkeypatch):
+    manager, dev = staff["manager"], staff["dev"]
+    target = Employee(full_name="Target", position_id=staff["lead"].id, salary=900)
+    db.session.add(target)
+    db.session.add_all(
+        Employee(
+            full_name=f"Extra {i}",
+            position_id=dev.id,
+            salary=500,
+            manager_id=manager.id,
+        )
+        for i in range(147)
+    )
+    db.session.commit()
+
+    original = JobContext.progress
+
+    def cancel_after_first_batch(self, done, total):
+        db.session.execute(
+            db.update(Job).where(Job.id == self.job_id).values(cancel_requested=True)
+        )
+        db.session.commit()
+        original(self, done, total)
+
+    monkeypatch.setattr(JobContext, "progress", cancel_after_first_batch)
+    reassign = jobs.enqueue(
+        "reassign_subordinates",
+        {"from_manager_id": manager.id, "to_manager_id": target.id},
+    )
+    jobs.claim_next("w")
+    jobs.run_job(reassign.id, "exports")
+
+    state = job_state(reassign.id)
+    assert state.status == Job.STATUS_CANCELLED
+    assert state.result["moved"] == 100
+    assert Employee.query.filter_by(manager_id=target.id).count() == 100
+
+
+def test_stale_job_is_requeued(tenant):
+    job_id = jobs.enqueue("refresh_org_stats").id
+    jobs.claim_next("gone")
+    db.session.execute(
+        db.update(Job)
+        .where(Job.id == job_id)
+        .values(heartbeat_at=datetime.utcnow() - timedelta(minutes=10))
+    )
+    db.session.commit()
+
+    assert jobs.requeue_stale(60) == 1
+    state = job_state(job_id)
+    assert state.status == Job.STATUS_QUEUED
+    assert state.worker is None
+    assert jobs.requeue_stale(60) == 0
+
+
+def test_stop_requeues_running_job(app, tenant, handlers):
+    started = threading.Event()
+
+    def endless(ctx: JobContext):
+        started.set()
+        while True:
+            ctx.progress(1, 2)
+            time.sleep(0.01)
+
+    handlers("endless", endless)
+    job_id = jobs.enqueue("endless").id
+    runner = JobRunner()
+    runner.init_app(app)
+    runner.ensure_started(1)
+    try:
+        assert started.wait(5)
+    finally:
+        runner.stop(timeout=5)
+
+    state = job_state(job_id)
+    assert state.status == Job.STATUS_QUEUED
+    assert state.worker is None
+
+
+def test_runner_completes_job(app, tenant):
+    job_id = jobs.enqueue("refresh_org_stats").id
+    runner = JobRunner()
+    runner.init_app(app)
+    runner.ensure_started(1)
+    try:
+        deadline = time.monotonic() + 5
+        while job_state(job_id).status != Job.STATUS_DONE:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+    finally:
+        runner.stop(timeout=5)
+
+    assert job_state(job_id).progress == 100
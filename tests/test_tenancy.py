@@ -0,0 +1,37 @@
+from app import db
+from app.models import Employee, Position, Tenant
+from app.tenancy import get_or_create_tenant, set_current_tenant
+
+
+def test_deleted_tenant_falls_back_to_default(app, tenant):
+    acme = get_or_create_tenant("acme", "Acme")
+    client = app.test_client()
+
+    client.post("/switch_tenant", data={"tenant": "acme"})
+    with client.session_transaction() as session:
+        assert session["tenant"] == "acme"
+    assert client.get("/").status_code == 200
+
+    db.session.delete(acme)
+    db.session.commit()
+
+    assert client.get("/").status_code == 200
+    with client.session_transaction() as session:
+        assert "tenant" not in session
+
+
+def test_queries_see_only_current_tenant(tenant):
+    other = get_or_create_tenant("acme", "Acme")
+    db.session.add(Position(title="Developer", level=5))
+    db.session.commit()
+
+    set_current_tenant(other.id)
+    assert Position.query.count() == 0
+    db.session.add(Position(title="Developer", level=5))
+    db.session.commit()
+    assert Position.query.count() == 1
+
+    set_current_tenant(None)
+    assert Position.query.count() == 2
+    assert Employee.query.count() == 0
+    assert Tenant.query.count() == 2